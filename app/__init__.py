@@ -2,13 +2,15 @@
 from fastapi import FastAPI
 from .config import setup_cors
 
-# Router erst NACH dem App-Objekt importieren vermeidet Zirkularimporte
-from .ui import router as ui_router
-from .guests import router as guests_router
-from .api import router as api_router
-
 
 def create_app() -> FastAPI:
+    # Router erst hier importieren: vermeidet Zirkularimporte, und Offline-Werkzeuge
+    # (render_jobs.py) koennen app.config/app.render nutzen, ohne Server-Zustand
+    # (Vorlagen-DB, Bild-Cache, Gast-DB) anzulegen
+    from .ui import router as ui_router
+    from .guests import router as guests_router
+    from .api import router as api_router
+
     app = FastAPI(title="Printer API")
     setup_cors(app)
     app.include_router(ui_router)
@@ -1,14 +1,33 @@
 # app/api.py
-from fastapi import APIRouter, Request, UploadFile, File, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Request, UploadFile, File, Form, Query, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from pydantic import BaseModel, Field
 from PIL import Image
-import io
+import io, json, asyncio, logging
 
-from .config import PRINT_WIDTH_PX, ReceiptCfg, now_str, APP_API_KEY
-from .render import render_receipt, pil_to_base64_png
-from .mqtt_client import mqtt_publish_image_base64
+from .config import (PRINT_WIDTH_PX, ReceiptCfg, now_str, APP_API_KEY, TEMPLATES_FILE, TEXT_MODE,
+                     IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_MB, settings_mtime,
+                     COALESCE_WINDOW_MS, COALESCE_MAX_WINDOW_MS, COALESCE_MAX_HEIGHT_PX, MAX_BACKLOG, FEED_MIN_DOTS,
+                     INGEST_CONCURRENCY)
+from .security import require_ui_auth
+from .mqtt_client import (mqtt_publish_data, backlog, job_status, recent_jobs,
+                          subscribe_jobs, unsubscribe_jobs)
+from .jobs import publish_receipt, encode_image, encode_receipt
+from .render import render_image_with_headers
+from .templates import TemplateDB
+from .imgcache import ImageCache
+from .coalesce import Coalescer
+from .profiling import profiled, list_profiles, collapsed
+
+log = logging.getLogger(__name__)
+
+TEMPLATES = TemplateDB(TEMPLATES_FILE)
+IMAGES = ImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_MB * 1024 * 1024)
+COALESCER = Coalescer(COALESCE_WINDOW_MS, COALESCE_MAX_WINDOW_MS, COALESCE_MAX_HEIGHT_PX)
 
 router = APIRouter()
+router.add_event_handler("shutdown", COALESCER.flush_all)  # gesammelte Notizen nicht verlieren
 
 
 def _check_api_key(req: Request):
@@ -17,66 +36,332 @@ def _check_api_key(req: Request):
         raise HTTPException(status_code=401, detail="invalid api key")
 
 
+def _admit():
+    # Rueckstau am Drucker zu gross -> Client soll spaeter nochmal senden
+    if MAX_BACKLOG and backlog() >= MAX_BACKLOG:
+        raise HTTPException(status_code=503, detail="printer backlog full", headers={"Retry-After": "5"})
+
+
 class PrintPayload(BaseModel):
     title: str = "TASKS"
     lines: list[str] = []
     cut: bool = True
     add_datetime: bool = True
+    text_mode: bool | None = None  # None = TEXT_MODE aus ENV
+    qos: int | None = Field(None, ge=0, le=2)  # None = PUBLISH_QOS
+
+
+class TemplateDef(BaseModel):
+    title: str = ""
+    lines: list[str] = []
+    add_datetime: bool = False
+    cut: bool = True
 
 
 class RawPayload(BaseModel):
     text: str
     add_datetime: bool = False
+    text_mode: bool | None = None
+    qos: int | None = Field(None, ge=0, le=2)
+    sender: str | None = None  # erscheint als "Von: ..."; gleicher Absender wird gesammelt
+    combine: bool = False      # ohne Absender: darf mit anderen Notizen zusammen gedruckt werden
 
 
 @router.get("/")
 def ok():
     # kleine Diagnose ohne Key
     from .config import TOPIC, PUBLISH_QOS
-    return {"ok": True, "topic": TOPIC, "qos": PUBLISH_QOS}
+    return {"ok": True, "topic": TOPIC, "qos": PUBLISH_QOS, "backlog": backlog()}
 
 
 @router.post("/print")
+@profiled("print")
 async def print_job(p: PrintPayload, request: Request):
     _check_api_key(request)
-    cfg = ReceiptCfg()
-    img = render_receipt(p.title, p.lines, add_time=p.add_datetime, width_px=PRINT_WIDTH_PX, cfg=cfg)
-    b64 = pil_to_base64_png(img)
-    mqtt_publish_image_base64(b64, cut_paper=(1 if p.cut else 0))
-    return {"ok": True}
+    _admit()
+    tid = publish_receipt(p.title, p.lines, add_time=p.add_datetime, cut=p.cut, text_mode=p.text_mode, qos=p.qos)
+    return {"ok": True, "ticket_id": tid}
 
 
 @router.post("/api/print/template")
+@profiled("print/template")
 async def api_print_template(p: PrintPayload, request: Request):
     _check_api_key(request)
-    cfg = ReceiptCfg()
-    img = render_receipt(p.title, p.lines, add_time=p.add_datetime, width_px=PRINT_WIDTH_PX, cfg=cfg)
-    b64 = pil_to_base64_png(img)
-    mqtt_publish_image_base64(b64, cut_paper=(1 if p.cut else 0))
-    return {"ok": True}
+    _admit()
+    tid = publish_receipt(p.title, p.lines, add_time=p.add_datetime, cut=p.cut, text_mode=p.text_mode, qos=p.qos)
+    return {"ok": True, "ticket_id": tid}
 
 
 @router.post("/api/print/raw")
+@profiled("print/raw")
 async def api_print_raw(p: RawPayload, request: Request):
     _check_api_key(request)
-    cfg = ReceiptCfg()
+    _admit()
     lines = (p.text + (f"\n{now_str('%Y-%m-%d %H:%M')}" if p.add_datetime else "")).splitlines()
-    img = render_receipt("", lines, add_time=False, width_px=PRINT_WIDTH_PX, cfg=cfg)
-    b64 = pil_to_base64_png(img)
-    mqtt_publish_image_base64(b64, cut_paper=1)
-    return {"ok": True}
+    if COALESCER.enabled and (p.sender or p.combine):
+        COALESCER.submit(p.sender or "", lines, text_mode=p.text_mode, qos=p.qos)
+        return {"ok": True, "queued": True}
+    tid = publish_receipt("", lines, add_time=False, sender_name=p.sender, text_mode=p.text_mode, qos=p.qos)
+    return {"ok": True, "ticket_id": tid}
 
 
 @router.post("/api/print/image")
-async def api_print_image(request: Request, file: UploadFile = File(...)):
+@profiled("print/image")
+async def api_print_image(
+    request: Request,
+    file: UploadFile = File(...),
+    title: str | None = Form(None),
+    subtitle: str | None = Form(None),
+    dither: bool = Form(True),
+    qos: int | None = Form(None, ge=0, le=2),
+):
     _check_api_key(request)
+    _admit()
     content = await file.read()
-    img = Image.open(io.BytesIO(content)).convert("L")
-    w, h = img.size
-    if w != PRINT_WIDTH_PX:
-        img = img.resize((PRINT_WIDTH_PX, int(h * (PRINT_WIDTH_PX / w))))
-    # direkt senden (kein Titel/Untertitel hier – das ist in UI/Gast abgedeckt)
-    from .render import pil_to_base64_png
-    b64 = pil_to_base64_png(img)
-    mqtt_publish_image_base64(b64, cut_paper=1)
+    # Kopfzeilen haengen vom Layout ab -> Einstellungsstand mit in den Schluessel
+    key = IMAGES.key(content, width=PRINT_WIDTH_PX, dither=dither, title=title or "", subtitle=subtitle or "",
+                     feed=FEED_MIN_DOTS, settings=(settings_mtime() if (title or subtitle) else None))
+    cached = IMAGES.get(key)
+    if cached is None:
+        img = Image.open(io.BytesIO(content))
+        if title or subtitle:
+            img = render_image_with_headers(img, PRINT_WIDTH_PX, ReceiptCfg(), title=title, subtitle=subtitle)
+        else:
+            img = img.convert("L")
+            w, h = img.size
+            if w != PRINT_WIDTH_PX:
+                img = img.resize((PRINT_WIDTH_PX, int(h * (PRINT_WIDTH_PX / w))))
+        data = encode_image(img, dither=dither)
+        IMAGES.put(key, json.dumps(data).encode())
+    else:
+        data = json.loads(cached)
+    tid = mqtt_publish_data(data, cut_paper=1, qos=qos)
+    return {"ok": True, "hash": key, "ticket_id": tid}
+
+
+@router.post("/api/print/image/{key}")
+async def api_reprint_image(key: str, request: Request, qos: int | None = Query(None, ge=0, le=2)):
+    # erneut drucken ohne Upload; key = "hash" aus /api/print/image
+    _check_api_key(request)
+    _admit()
+    cached = IMAGES.get(key)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="unknown image hash")
+    tid = mqtt_publish_data(json.loads(cached), cut_paper=1, qos=qos)
+    return {"ok": True, "hash": key, "ticket_id": tid}
+
+
+# --- Server-seitige Vorlagen ---
+@router.get("/api/templates")
+async def api_templates(request: Request):
+    _check_api_key(request)
+    return {"ok": True, "templates": TEMPLATES.list()}
+
+
+@router.put("/api/templates/{name}")
+async def api_template_put(name: str, t: TemplateDef, request: Request):
+    _check_api_key(request)
+    try:
+        TEMPLATES.put(name, t.title, t.lines, add_datetime=t.add_datetime, cut=t.cut)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"ok": True}
+
+
+@router.delete("/api/templates/{name}")
+async def api_template_delete(name: str, request: Request):
+    _check_api_key(request)
+    if not TEMPLATES.delete(name):
+        raise HTTPException(status_code=404, detail="unknown template")
     return {"ok": True}
+
+
+@router.post("/api/print/template/{name}")
+@profiled("print/template/{name}")
+async def api_print_named_template(name: str, variables: dict[str, str], request: Request,
+                                   text_mode: bool | None = None,
+                                   qos: int | None = Query(None, ge=0, le=2)):
+    _check_api_key(request)
+    _admit()
+    if not TEMPLATES.get(name):
+        raise HTTPException(status_code=404, detail="unknown template")
+    try:
+        tid = _print_named(name, variables, text_mode=text_mode, qos=qos)
+    except KeyError as e:
+        raise HTTPException(status_code=422, detail=f"missing variable: {e.args[0]}")
+    return {"ok": True, "ticket_id": tid}
+
+
+def _encode_named(name: str, variables: dict[str, str], text_mode: bool | None = None) -> tuple[dict, int]:
+    tpl = TEMPLATES.get(name)
+    if TEXT_MODE if text_mode is None else text_mode:
+        return encode_receipt(tpl["title"], TEMPLATES.expand(name, variables),
+                              add_time=tpl["add_datetime"], cut=tpl["cut"], text_mode=True)
+    return encode_image(TEMPLATES.render(name, variables, PRINT_WIDTH_PX)), (1 if tpl["cut"] else 0)
+
+
+def _print_named(name: str, variables: dict[str, str], text_mode: bool | None = None,
+                 qos: int | None = None, stream: str | None = None) -> str:
+    data, cut_paper = _encode_named(name, variables, text_mode)
+    return mqtt_publish_data(data, cut_paper=cut_paper, qos=qos, stream=stream)
+
+
+# --- Job-Status (Quittungen vom Drucker) ---
+@router.get("/api/jobs")
+async def api_jobs(request: Request):
+    _check_api_key(request)
+    return {"ok": True, "backlog": backlog(), "jobs": recent_jobs()}
+
+
+@router.get("/api/jobs/events")
+async def api_job_events(request: Request):
+    # Server-Sent Events; Cookie (UI) oder API-Key, da EventSource keine Header setzen kann
+    if not require_ui_auth(request):
+        raise HTTPException(status_code=401, detail="invalid api key")
+    q = subscribe_jobs()
+
+    async def stream():
+        try:
+            yield f"event: backlog\ndata: {json.dumps({'backlog': backlog()})}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    ev = await asyncio.wait_for(q.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield f"data: {json.dumps({**ev, 'backlog': backlog()})}\n\n"
+        finally:
+            unsubscribe_jobs(q)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/api/jobs/{ticket_id}")
+async def api_job(ticket_id: str, request: Request):
+    _check_api_key(request)
+    job = job_status(ticket_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="unknown ticket_id")
+    return {"ok": True, **job}
+
+
+# --- Profile einzelner Auftraege (X-Profile: 1) ---
+@router.get("/api/profiles")
+async def api_profiles(request: Request):
+    _check_api_key(request)
+    return {"ok": True, "profiles": list_profiles()}
+
+
+@router.get("/api/profiles/{profile_id}", response_class=PlainTextResponse)
+async def api_profile(profile_id: int, request: Request):
+    # collapsed stacks, direkt nutzbar mit flamegraph.pl oder speedscope
+    _check_api_key(request)
+    text = collapsed(profile_id)
+    if text is None:
+        raise HTTPException(status_code=404, detail="unknown profile")
+    return PlainTextResponse(text, headers={"Content-Disposition": f"attachment; filename=profile-{profile_id}.folded"})
+
+
+# --- Dauerverbindung fuer viele kleine Auftraege ---
+def _ingest_encode(job: dict) -> tuple[dict, int, int | None]:
+    # gleiche Formen wie die Einzel-Endpunkte: {"template", "vars"} / RawPayload / PrintPayload
+    # -> (Nutzdaten, cut_paper, qos); gesendet wird getrennt, damit die Reihenfolge bleibt
+    if "template" in job:
+        if not TEMPLATES.get(job["template"]):
+            raise ValueError("unknown template")
+        qos = job.get("qos")
+        if qos not in (None, 0, 1, 2):
+            raise ValueError("qos must be 0, 1 or 2")
+        try:
+            return (*_encode_named(job["template"], {str(k): str(v) for k, v in job.get("vars", {}).items()},
+                                   text_mode=job.get("text_mode")), qos)
+        except KeyError as e:
+            raise ValueError(f"missing variable: {e.args[0]}")
+    if "text" in job:
+        p = RawPayload.model_validate(job)
+        lines = (p.text + (f"\n{now_str('%Y-%m-%d %H:%M')}" if p.add_datetime else "")).splitlines()
+        return (*encode_receipt("", lines, add_time=False, sender_name=p.sender, text_mode=p.text_mode), p.qos)
+    p = PrintPayload.model_validate(job)
+    return (*encode_receipt(p.title, p.lines, add_time=p.add_datetime, cut=p.cut, text_mode=p.text_mode), p.qos)
+
+
+@router.websocket("/api/ingest")
+async def api_ingest(ws: WebSocket):
+    """
+    Eine authentifizierte Verbindung, beliebig viele Jobs: jede Textnachricht enthaelt
+    eine oder mehrere JSON-Zeilen (NDJSON). Pro Job kommt eine Quittung zurueck:
+      {"seq": 1, "ok": true, "ticket_id": "web-..."} bzw. {"seq": 2, "ok": false, "error": "..."}
+    "seq" ist das optionale "id"-Feld des Jobs, sonst die laufende Nummer.
+    Bis zu INGEST_CONCURRENCY Jobs werden vorgelesen und gleichzeitig gerendert; jeder
+    Job wird gesendet und quittiert, sobald er selbst fertig ist, aber immer in
+    Eingangsreihenfolge (eine feste MQTT-Verbindung pro Ingest-Verbindung).
+    Flusskontrolle: sind INGEST_CONCURRENCY Jobs offen, wird nicht weitergelesen; bei vollem
+    Drucker-Rueckstau (MAX_BACKLOG) wird gewartet statt abgelehnt.
+    Trennt der Client, werden alle bereits gelesenen Jobs trotzdem gedruckt, nur ihre
+    Quittungen gehen verloren (Anzahl im Log). Ein Job ohne Quittung kann also gedruckt sein.
+    """
+    if (ws.headers.get("x-api-key") or ws.query_params.get("key")) != APP_API_KEY:
+        await ws.close(code=1008)
+        return
+    await ws.accept()
+    stream = f"ingest-{id(ws)}"  # alle Jobs dieser Verbindung ueber eine MQTT-Verbindung (Reihenfolge)
+    inflight: asyncio.Queue = asyncio.Queue(maxsize=max(1, INGEST_CONCURRENCY))  # (seq, Task), None = Ende
+    connected = True
+    unacked = 0
+
+    async def encode(job):
+        if isinstance(job, Exception):
+            raise job
+        return await run_in_threadpool(_ingest_encode, job)
+
+    async def receive():
+        seq = 0
+        try:
+            while True:
+                for line in (await ws.receive_text()).splitlines():
+                    if not line.strip():
+                        continue
+                    seq += 1
+                    try:
+                        job = json.loads(line)
+                        if not isinstance(job, dict):
+                            raise ValueError("job must be a JSON object")
+                        job_seq = job.pop("id", seq)
+                    except ValueError as e:
+                        job, job_seq = e, seq
+                    await inflight.put((job_seq, asyncio.create_task(encode(job))))
+        except (WebSocketDisconnect, RuntimeError, KeyError):
+            await inflight.put(None)
+
+    async def finish():
+        # aeltester Job zuerst: senden und quittieren in Eingangsreihenfolge
+        nonlocal connected, unacked
+        while (item := await inflight.get()) is not None:
+            seq, task = item
+            try:
+                data, cut_paper, qos = await task
+                while MAX_BACKLOG and backlog() >= MAX_BACKLOG:
+                    await asyncio.sleep(0.2)
+                tid = await run_in_threadpool(mqtt_publish_data, data, cut_paper=cut_paper, qos=qos, stream=stream)
+                ack = {"seq": seq, "ok": True, "ticket_id": tid}
+            except Exception as e:
+                ack = {"seq": seq, "ok": False, "error": str(e)}
+            if connected:
+                try:
+                    await ws.send_text(json.dumps(ack))
+                    continue
+                except (WebSocketDisconnect, RuntimeError):
+                    connected = False
+            unacked += 1
+
+    reader = asyncio.create_task(receive())
+    try:
+        await finish()  # endet nach dem letzten gelesenen Job (Verbindung zu)
+    finally:
+        reader.cancel()
+        while not inflight.empty():
+            item = inflight.get_nowait()
+            if item is not None:
+                item[1].cancel()
+    if unacked:
+        log.warning("ingest %s: %d Jobs gedruckt/verarbeitet, Quittung nicht zugestellt", stream, unacked)
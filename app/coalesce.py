@@ -0,0 +1,106 @@
+import asyncio, math, time, logging
+from typing import Dict, List, Tuple
+from .config import PRINT_WIDTH_PX, ReceiptCfg
+from .jobs import publish_receipt
+
+log = logging.getLogger(__name__)
+
+SEPARATOR = "- - - - - - - - - -"
+RETRIES = 3
+RETRY_DELAY_S = 5.0
+
+# (Absender, text_mode, qos): nur Notizen mit gleichen Druckoptionen werden zusammengelegt
+_Key = Tuple[str, "bool | None", "int | None"]
+
+
+class _Batch:
+    def __init__(self):
+        self.jobs: List[List[str]] = []
+        self.height = 0
+        self.first = time.monotonic()
+        self.timer: asyncio.TimerHandle | None = None
+
+
+class Coalescer:
+    """
+    Sammelt kleine Notizen pro Absender fuer ein kurzes Fenster und druckt sie
+    zusammen als eine Quittung (Trennlinie dazwischen, ein Schnitt, eine MQTT-Nachricht).
+    Jede neue Notiz verlaengert das Fenster, hoechstens bis max_window_ms nach der ersten.
+    Fehlgeschlagene Sammeldrucke werden bis zu RETRIES-mal wiederholt; flush_all()
+    beim Herunterfahren sendet alles, was noch wartet.
+    """
+
+    def __init__(self, window_ms: int, max_window_ms: int, max_height_px: int):
+        self.window = window_ms / 1000
+        self.max_window = max(window_ms, max_window_ms) / 1000
+        self.max_height = max_height_px
+        self._batches: Dict[_Key, _Batch] = {}
+        self._retries: Dict[asyncio.TimerHandle, Tuple[_Key, List[str], int]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def _estimate(self, lines: List[str], cfg: ReceiptCfg) -> int:
+        # grobe Hoehe ohne zu rendern: Zeilenhoehe x (umgebrochene) Zeilen
+        ascent, descent = cfg.font_text.getmetrics()
+        lh = int((ascent + descent) * cfg.line_height_mult)
+        max_w = max(1, PRINT_WIDTH_PX - cfg.margin_left - cfg.margin_right)
+        rows = sum(max(1, math.ceil(cfg.font_text.getlength(ln.strip()) / max_w)) for ln in lines)
+        return (rows + 3) * lh  # + Trennlinie
+
+    def submit(self, sender: str, lines: List[str], text_mode: bool | None = None, qos: int | None = None):
+        loop = asyncio.get_running_loop()
+        key: _Key = (sender, text_mode, qos)
+        est = self._estimate(lines, ReceiptCfg())
+        b = self._batches.get(key)
+        if b and b.height + est > self.max_height:
+            self.flush(key)
+        b = self._batches.setdefault(key, _Batch())
+        b.jobs.append(lines)
+        b.height += est
+        if b.height >= self.max_height:
+            self.flush(key); return
+        if b.timer:
+            b.timer.cancel()
+        delay = min(self.window, b.first + self.max_window - time.monotonic())
+        b.timer = loop.call_later(max(0.0, delay), self.flush, key)
+
+    def flush(self, key: _Key):
+        b = self._batches.pop(key, None)
+        if not b:
+            return
+        if b.timer:
+            b.timer.cancel()
+        lines: List[str] = []
+        for i, job in enumerate(b.jobs):
+            if i:
+                lines += ["", SEPARATOR, ""]
+            lines += job
+        self._send(key, lines, 0)
+
+    def flush_all(self):
+        """Beim Herunterfahren: offene Sammlungen und wartende Wiederholungen sofort senden."""
+        for key in list(self._batches):
+            self.flush(key)
+        pending, self._retries = self._retries, {}
+        for handle, (key, lines, attempt) in pending.items():
+            handle.cancel()
+            self._send(key, lines, RETRIES)  # letzter Versuch, danach nur noch loggen
+
+    def _send(self, key: _Key, lines: List[str], attempt: int, handle: asyncio.TimerHandle | None = None):
+        if handle is not None:
+            self._retries.pop(handle, None)
+        sender, text_mode, qos = key
+        try:
+            publish_receipt("", lines, add_time=False, sender_name=(sender or None), text_mode=text_mode, qos=qos)
+        except Exception:
+            if attempt >= RETRIES:
+                log.exception("Sammeldruck fuer %r verworfen (%d Zeilen)", sender, len(lines))
+                return
+            log.warning("Sammeldruck fuer %r fehlgeschlagen, neuer Versuch in %.0f s",
+                        sender, RETRY_DELAY_S, exc_info=True)
+            loop = asyncio.get_running_loop()
+            h: List[asyncio.TimerHandle] = []
+            h.append(loop.call_later(RETRY_DELAY_S, lambda: self._send(key, lines, attempt + 1, h[0])))
+            self._retries[h[0]] = (key, lines, attempt + 1)
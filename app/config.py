@@ -14,9 +14,61 @@ SETTINGS_FILE = os.getenv("SETTINGS_FILE", "settings.json")
 
 GUEST_DB_FILE = os.getenv("GUEST_DB_FILE", "guest_tokens.json")
 
+TEMPLATES_FILE = os.getenv("TEMPLATES_FILE", "templates.json")
+
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "image_cache")
+IMAGE_CACHE_MAX_MB = int(os.getenv("IMAGE_CACHE_MAX_MB", "64"))  # 0 = Cache aus
+
 TIMEZONE = os.getenv("TIMEZONE", "Europe/Zurich")
 TZ = ZoneInfo(TIMEZONE)
 
+# ---------- MQTT-Publisher ----------
+# Mehrere Verbindungen verteilen grosse Bilder; QoS 1 reicht, da die Bridge per ticket_id dedupliziert.
+# Achtung: MQTT ordnet nur innerhalb einer Verbindung. Bei > 1 koennen sich Quittungen ueberholen,
+# ausser sie gehoeren zum selben Absender bzw. zur selben /api/ingest-Verbindung (feste Verbindung).
+MQTT_POOL_SIZE = int(os.getenv("MQTT_POOL_SIZE", "1"))
+MQTT_MAX_INFLIGHT = int(os.getenv("MQTT_MAX_INFLIGHT", "20"))  # pro Verbindung
+
+# Weisse Zeilenlaeufe ab dieser Hoehe (Punkte) als Papiervorschub statt als Pixel senden; 0 = aus
+FEED_MIN_DOTS = int(os.getenv("FEED_MIN_DOTS", "0"))
+
+# ---------- Textmodus (ESC/POS statt Bitmap) ----------
+# Reiner Text wird als Druckerbefehle gesendet statt als PNG gerastert.
+TEXT_MODE = os.getenv("TEXT_MODE", "0") == "1"
+TEXT_CODEPAGE = os.getenv("TEXT_CODEPAGE", "cp437")          # Python-Codec der Druckerschrift
+TEXT_CODEPAGE_ID = int(os.getenv("TEXT_CODEPAGE_ID", "0"))   # ESC t n, 0 = PC437
+TEXT_CHAR_PX = int(os.getenv("TEXT_CHAR_PX", "12"))          # Breite eines Zeichens (Font A)
+
+# Glyphen der Quittungsschriften einmal rastern und danach nur noch zusammensetzen
+GLYPH_ATLAS = os.getenv("GLYPH_ATLAS", "0") == "1"
+
+# ---------- Druckerstatus / Quittungen vom Drucker ----------
+# Drucker meldet {"ticket_id": ..., "state": "printed"|"error"|..., "queue": n} auf STATUS_TOPIC.
+STATUS_TOPIC = os.getenv("STATUS_TOPIC", "")         # leer = nicht abonnieren
+ACK_TIMEOUT_S = int(os.getenv("ACK_TIMEOUT_S", "300"))  # danach zaehlt ein Job nicht mehr zum Rueckstau
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "500"))
+MAX_BACKLOG = int(os.getenv("MAX_BACKLOG", "0"))      # 0 = keine Annahmegrenze
+
+# ---------- Profiling einzelner Druckauftraege ----------
+# Header "X-Profile: 1" (mit gueltigem API-Key) oder zufaellige Stichprobe; 0 = nur per Header
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+
+# ---------- Dauerverbindung /api/ingest ----------
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))  # gelesene, noch nicht quittierte Jobs pro Verbindung
+
+# ---------- Sammeldruck kleiner Notizen ----------
+# Kleine Rohnotizen desselben Absenders innerhalb des Fensters -> eine Quittung, ein Schnitt.
+COALESCE_WINDOW_MS = int(os.getenv("COALESCE_WINDOW_MS", "0"))            # 0 = aus
+COALESCE_MAX_WINDOW_MS = int(os.getenv("COALESCE_MAX_WINDOW_MS", "10000"))
+COALESCE_MAX_HEIGHT_PX = int(os.getenv("COALESCE_MAX_HEIGHT_PX", "2400"))
+
+
+def settings_mtime() -> float:
+    """Aendert sich, sobald die Layout-Einstellungen gespeichert werden (fuer Caches)."""
+    return os.path.getmtime(SETTINGS_FILE) if os.path.exists(SETTINGS_FILE) else 0
+
 
 def now_str(fmt: str = "%d.%m.%Y %H:%M") -> str:
     return datetime.now(TZ).strftime(fmt)
@@ -0,0 +1,82 @@
+import textwrap
+from typing import List
+from .config import ReceiptCfg, TEXT_CODEPAGE, TEXT_CODEPAGE_ID, TEXT_CHAR_PX
+from .render import _time_str
+
+# ESC/POS-Textmodus: gleiche Anordnung wie render_receipt, aber als Druckerbefehle
+# statt als Bitmap. Gibt None zurueck, wenn die Druckerschrift den Text nicht kann.
+
+ESC, GS = b"\x1b", b"\x1d"
+_ALIGN = {"left": 0, "center": 1, "right": 2}
+
+
+def _enc(text: str) -> bytes:
+    if not text.isprintable():  # keine Steuerzeichen in den Befehlsstrom lassen
+        raise ValueError("non-printable text")
+    return text.encode(TEXT_CODEPAGE)
+
+def _u16(n: int) -> bytes:
+    n = max(0, min(0xFFFF, int(n)))
+    return bytes([n & 0xFF, n >> 8])
+
+def _feed(dots: int) -> bytes:
+    out, dots = b"", int(dots)
+    while dots > 0:
+        n = min(255, dots); out += ESC + b"J" + bytes([n]); dots -= n
+    return out
+
+def _align(align: str) -> bytes:
+    return ESC + b"a" + bytes([_ALIGN.get(align, 0)])
+
+def _wrap(text: str, cols: int) -> List[str]:
+    return textwrap.wrap(text, width=max(1, cols)) or [""]
+
+def render_receipt_escpos(
+    title: str,
+    lines: List[str],
+    add_time: bool,
+    width_px: int,
+    cfg: ReceiptCfg,
+    sender_name: str | None = None,
+    cut: bool = True
+) -> bytes | None:
+    usable = width_px - cfg.margin_left - cfg.margin_right
+    cols = max(1, usable // TEXT_CHAR_PX)
+    try:
+        out = ESC + b"@" + ESC + b"t" + bytes([TEXT_CODEPAGE_ID])
+        out += GS + b"L" + _u16(cfg.margin_left) + GS + b"W" + _u16(usable)
+        out += ESC + b"3" + bytes([max(1, min(255, int(2 * TEXT_CHAR_PX * cfg.line_height_mult)))])
+        out += _feed(cfg.margin_top)
+
+        # Titel: fett, doppelte Hoehe und Breite
+        title_lines = _wrap(title.strip(), cols // 2) if title and title.strip() else []
+        if title_lines:
+            out += _align(cfg.align_title) + ESC + b"E\x01" + GS + b"!\x11"
+            for ln in title_lines:
+                out += _enc(ln) + b"\n"
+            out += GS + b"!\x00" + ESC + b"E\x00"
+            if cfg.rule_after_title:
+                out += _feed(cfg.rule_pad) + _align("left") + _enc("-" * cols) + b"\n" + _feed(cfg.rule_pad)
+            else:
+                out += _feed(cfg.gap_title_text)
+
+        # Sender / Zeit
+        meta = ([f"Von: {sender_name}"] if sender_name else []) + ([_time_str(cfg)] if add_time else [])
+        if meta:
+            out += _align(cfg.align_time)
+            for t in meta:
+                out += b"".join(_enc(ln) + b"\n" for ln in _wrap(t, cols))
+
+        # Body
+        out += _align(cfg.align_text)
+        for raw in lines:
+            if not raw.strip():
+                out += b"\n"; continue
+            out += b"".join(_enc(ln) + b"\n" for ln in _wrap(raw.strip(), cols))
+
+        out += _feed(cfg.margin_bottom)
+        if cut:
+            out += GS + b"V\x42\x00"  # vorschieben + Teilschnitt
+        return out
+    except (UnicodeEncodeError, ValueError):
+        return None
@@ -0,0 +1,81 @@
+from typing import Dict, List, Tuple
+from PIL import Image, ImageDraw, ImageFont
+
+# Glyph-Atlas: jede (Schrift, Zeichen)-Kombination wird einmal durch FreeType gerastert,
+# Zeilen entstehen danach durch Zusammensetzen der fertigen Masken. Positionen und
+# Ueberlagerung folgen draw.text mit Layout.BASIC (Vorschub + Kerning, gerundet; ueberlappende
+# Glyphen werden wie in FreeType-Rendering von Pillow ueberblendet, nicht maximiert).
+# Nur fuer Layout.BASIC: mit RAQM (HarfBuzz: Ligaturen, Shaping) entspricht eine Zeile nicht
+# der Summe ihrer Zeichen, solche Schriften gehen immer ueber draw.text (siehe supported()).
+# Pixelgleichheit und Laufzeit prueft bench_glyphs.py.
+
+
+class GlyphAtlas:
+    def __init__(self, font: ImageFont.FreeTypeFont):
+        self.font = font
+        self._glyphs: Dict[str, Tuple[Image.Image | None, int, int]] = {}
+        self._adv: Dict[str, float] = {}
+        self._kern: Dict[Tuple[str, str], float] = {}
+
+    def _glyph(self, ch: str) -> Tuple[Image.Image | None, int, int]:
+        g = self._glyphs.get(ch)
+        if g is None:
+            x0, y0, x1, y1 = self.font.getbbox(ch)
+            if x1 <= x0 or y1 <= y0:
+                g = (None, 0, 0)  # Leerzeichen u. ae.
+            else:
+                mask = Image.new("L", (x1 - x0, y1 - y0), 0)
+                ImageDraw.Draw(mask).text((-x0, -y0), ch, fill=255, font=self.font)
+                g = (mask, x0, y0)
+            self._glyphs[ch] = g
+        return g
+
+    def _advance(self, ch: str) -> float:
+        a = self._adv.get(ch)
+        if a is None:
+            a = self._adv[ch] = self.font.getlength(ch)
+        return a
+
+    def _kerning(self, a: str, b: str) -> float:
+        k = self._kern.get((a, b))
+        if k is None:
+            k = self._kern[(a, b)] = self.font.getlength(a + b) - self._advance(a) - self._advance(b)
+        return k
+
+    def draw(self, img: Image.Image, xy: Tuple[int, int], text: str, fill: int = 0):
+        x, y = xy
+        placed: List[Tuple[Image.Image, int, int]] = []
+        pen, prev = 0.0, None
+        for ch in text:
+            if prev is not None:
+                pen += self._kerning(prev, ch)
+            mask, ox, oy = self._glyph(ch)
+            if mask is not None:
+                placed.append((mask, int(pen + 0.5) + ox, oy))
+            pen += self._advance(ch)
+            prev = ch
+        if not placed:
+            return
+        left = min(px for _m, px, _py in placed); top = min(py for _m, _px, py in placed)
+        right = max(px + m.width for m, px, _py in placed); bottom = max(py + m.height for m, _px, py in placed)
+        line = Image.new("L", (right - left, bottom - top), 0)
+        for m, px, py in placed:
+            box = (px - left, py - top, px - left + m.width, py - top + m.height)
+            line.paste(255, box, m)
+        img.paste(fill, (x + left, y + top), line)
+
+
+_atlases: Dict[Tuple[str, int, int], GlyphAtlas] = {}
+
+
+def supported(font) -> bool:
+    return isinstance(font, ImageFont.FreeTypeFont) and font.layout_engine == ImageFont.Layout.BASIC
+
+
+def glyph_atlas(font: ImageFont.FreeTypeFont) -> GlyphAtlas:
+    # ReceiptCfg laedt die Schriften pro Auftrag neu, daher Schluessel ueber Datei/Groesse
+    key = (str(font.path), font.size, font.index)
+    atlas = _atlases.get(key)
+    if atlas is None:
+        atlas = _atlases[key] = GlyphAtlas(font)
+    return atlas
@@ -5,9 +5,9 @@ from PIL import Image
 import io
 
 from .config import GUEST_DB_FILE, PRINT_WIDTH_PX, ReceiptCfg, now_str
-from .render import render_receipt, render_image_with_headers, pil_to_base64_png
+from .render import render_receipt, render_image_with_headers
 from .config import require_ui_auth
-from .mqtt_client import mqtt_publish_image_base64
+from .jobs import publish_image
 from .ui import html_page, HTML_UI  # reuse layout
 
 from guest_tokens import GuestDB  # Root-Modul
@@ -51,7 +51,7 @@ async def guest_print_template(
     cfg = ReceiptCfg()
     img = render_receipt(title.strip(), [ln.rstrip() for ln in lines.splitlines()],
                          add_time=add_dt, width_px=PRINT_WIDTH_PX, cfg=cfg, sender_name=tok["name"])
-    b64 = pil_to_base64_png(img); mqtt_publish_image_base64(b64, cut_paper=1)
+    publish_image(img, stream=tok["name"])
     return RedirectResponse(f"/guest/{token}#tpl", status_code=303)
 
 
@@ -67,7 +67,7 @@ async def guest_print_raw(
     cfg = ReceiptCfg()
     lines = (text + (f"\n{now_str('%Y-%m-%d %H:%M')}" if add_dt else "")).splitlines()
     img = render_receipt("", lines, add_time=False, width_px=PRINT_WIDTH_PX, cfg=cfg, sender_name=tok["name"])
-    b64 = pil_to_base64_png(img); mqtt_publish_image_base64(b64, cut_paper=1)
+    publish_image(img, stream=tok["name"])
     return RedirectResponse(f"/guest/{token}#raw", status_code=303)
 
 
@@ -85,7 +85,7 @@ async def guest_print_image(
     cfg = ReceiptCfg()
     composed = render_image_with_headers(src, PRINT_WIDTH_PX, cfg,
                                          title=img_title, subtitle=img_subtitle, sender_name=tok["name"])
-    b64 = pil_to_base64_png(composed); mqtt_publish_image_base64(b64, cut_paper=1)
+    publish_image(composed, stream=tok["name"])
     return RedirectResponse(f"/guest/{token}#img", status_code=303)
 
 
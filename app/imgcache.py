@@ -0,0 +1,90 @@
+from __future__ import annotations
+import os, json, hashlib, threading
+from collections import OrderedDict
+
+
+class ImageCache:
+    """
+    LRU-Cache auf der Platte fuer fertig verarbeitete Bilder (kodierte Nutzdaten als JSON).
+    Schluessel = sha256(Upload-Bytes + Verarbeitungsparameter), Dateiname = <key>.json.
+    Die Reihenfolge ergibt sich beim Start aus der mtime, Treffer werden "angefasst".
+    """
+
+    def __init__(self, path: str = "image_cache", max_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lru: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        if max_bytes > 0:
+            self._load()
+
+    # --------- persistence ---------
+    def _load(self):
+        os.makedirs(self.path, exist_ok=True)
+        entries = []
+        for fn in os.listdir(self.path):
+            full = os.path.join(self.path, fn)
+            if fn.endswith(".json") and self.valid_key(fn[:-5]):
+                st = os.stat(full)
+                entries.append((st.st_mtime, fn[:-5], st.st_size))
+            elif fn.endswith((".png", ".tmp")):
+                # Eintraege aelterer Versionen (PNG) und abgebrochene Schreibvorgaenge
+                # wuerden sonst ungezaehlt neben dem Limit liegen bleiben
+                try:
+                    os.remove(full)
+                except OSError:
+                    pass
+        for _mt, key, size in sorted(entries):
+            self._lru[key] = size
+            self._total += size
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key + ".json")
+
+    # --------- utils ---------
+    @staticmethod
+    def key(content: bytes, **params) -> str:
+        h = hashlib.sha256(content)
+        h.update(json.dumps(params, sort_keys=True).encode())
+        return h.hexdigest()
+
+    @staticmethod
+    def valid_key(key: str) -> bool:
+        return len(key) == 64 and all(c in "0123456789abcdef" for c in key)
+
+    # --------- public API ---------
+    def get(self, key: str) -> bytes | None:
+        if self.max_bytes <= 0 or not self.valid_key(key):
+            return None
+        with self._lock:
+            if key not in self._lru:
+                return None
+            self._lru.move_to_end(key)
+        try:
+            with open(self._file(key), "rb") as f:
+                data = f.read()
+            os.utime(self._file(key))
+            return data
+        except OSError:
+            with self._lock:
+                self._total -= self._lru.pop(key, 0)
+            return None
+
+    def put(self, key: str, data: bytes):
+        if self.max_bytes <= 0 or len(data) > self.max_bytes:
+            return
+        tmp = self._file(key) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._file(key))
+        with self._lock:
+            self._total += len(data) - self._lru.pop(key, 0)
+            self._lru[key] = len(data)
+            while self._total > self.max_bytes and self._lru:
+                old, size = self._lru.popitem(last=False)
+                self._total -= size
+                try:
+                    os.remove(self._file(old))
+                except OSError:
+                    pass
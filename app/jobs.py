@@ -0,0 +1,51 @@
+import base64
+from typing import List, Tuple
+from PIL import Image
+from .config import PRINT_WIDTH_PX, ReceiptCfg, TEXT_MODE, FEED_MIN_DOTS
+from .render import render_receipt, pil_to_base64_png, split_blank_rows
+from .escpos import render_receipt_escpos
+from .mqtt_client import mqtt_publish_data
+
+
+def encode_image(img: Image.Image, dither: bool = True) -> dict:
+    """Bild -> Nutzdaten. Mit FEED_MIN_DOTS werden lange weisse Bereiche zu Vorschub:
+    {"data_type": "segments", "segments": [{"data_base64": ...}, {"feed_dots": 120}, ...]}"""
+    bw = img.convert("1", dither=(Image.Dither.FLOYDSTEINBERG if dither else Image.Dither.NONE))
+    if FEED_MIN_DOTS > 0:
+        parts = split_blank_rows(bw, FEED_MIN_DOTS)
+        if any(isinstance(p, int) for p in parts):
+            return {"data_type": "segments", "segments": [
+                {"feed_dots": p} if isinstance(p, int) else {"data_base64": pil_to_base64_png(p)}
+                for p in parts
+            ]}
+    return {"data_type": "png", "data_base64": pil_to_base64_png(bw)}
+
+
+def publish_image(img: Image.Image, cut: bool = True, qos: int | None = None, dither: bool = True,
+                  stream: str | None = None) -> str:
+    return mqtt_publish_data(encode_image(img, dither), cut_paper=(1 if cut else 0), qos=qos, stream=stream)
+
+
+def encode_receipt(title: str, lines: List[str], add_time: bool, cut: bool = True,
+                   sender_name: str | None = None, text_mode: bool | None = None) -> Tuple[dict, int]:
+    """Quittung rendern -> (Nutzdaten, cut_paper) fuer mqtt_publish_data. Im Textmodus
+    als ESC/POS (Schnitt im Befehlsstrom), sonst oder wenn die Druckerschrift ein
+    Zeichen nicht kennt als Bitmap."""
+    cfg = ReceiptCfg()
+    if TEXT_MODE if text_mode is None else text_mode:
+        cmds = render_receipt_escpos(title, lines, add_time=add_time, width_px=PRINT_WIDTH_PX,
+                                     cfg=cfg, sender_name=sender_name, cut=cut)
+        if cmds is not None:
+            return {"data_type": "escpos", "data_base64": base64.b64encode(cmds).decode("ascii")}, 0
+    img = render_receipt(title, lines, add_time=add_time, width_px=PRINT_WIDTH_PX, cfg=cfg, sender_name=sender_name)
+    return encode_image(img), (1 if cut else 0)
+
+
+def publish_receipt(title: str, lines: List[str], add_time: bool, cut: bool = True,
+                    sender_name: str | None = None, text_mode: bool | None = None,
+                    qos: int | None = None, stream: str | None = None) -> str:
+    """Quittung rendern und senden. Quittungen eines Absenders bleiben in
+    Reihenfolge (stream, siehe MQTT_POOL_SIZE)."""
+    data, cut_paper = encode_receipt(title, lines, add_time, cut=cut, sender_name=sender_name, text_mode=text_mode)
+    return mqtt_publish_data(data, cut_paper=cut_paper, qos=qos,
+                             stream=(stream if stream is not None else sender_name))
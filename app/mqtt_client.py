@@ -1,36 +1,183 @@
-import ssl, json, uuid, time
+import ssl, json, uuid, time, threading, asyncio, zlib
+from collections import OrderedDict
 import paho.mqtt.client as mqtt
 from .config import MQTT_HOST, MQTT_PORT, MQTT_USER, MQTT_PASS, MQTT_TLS, TOPIC, PUBLISH_QOS
+from .config import STATUS_TOPIC, ACK_TIMEOUT_S, JOB_HISTORY, MQTT_POOL_SIZE, MQTT_MAX_INFLIGHT
 
-_client: mqtt.Client | None = None
+# Pool von Publisher-Verbindungen; jede hat ihren eigenen Netzwerk-Thread.
+# Die erste Verbindung abonniert zusaetzlich STATUS_TOPIC.
+_clients: list[mqtt.Client] = []
+_inflight: dict[int, int] = {}  # id(client) -> unbestaetigte Publishes
+_pool_lock = threading.Lock()
 
-def mqtt_start():
-    global _client
-    _client = mqtt.Client()
+# ticket_id -> {"ticket_id", "state", "sent", "done", "latency_ms"}; aelteste fallen raus
+_jobs: "OrderedDict[str, dict]" = OrderedDict()
+_jobs_lock = threading.Lock()
+_printer_queue: tuple[int, float] | None = None  # (gemeldete Laenge, Zeitpunkt)
+_early_acks: "OrderedDict[str, tuple[str, float]]" = OrderedDict()  # Status zu noch unbekannten ticket_ids
+_listeners: list[tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+
+TERMINAL_STATES = ("printed", "error")
+
+def _on_connect(client, userdata, flags, rc, properties=None):
+    # bei jedem (Re-)Connect neu abonnieren
+    if STATUS_TOPIC:
+        client.subscribe(STATUS_TOPIC, qos=1)
+
+def _on_message(client, userdata, msg):
+    global _printer_queue
+    try:
+        data = json.loads(msg.payload)
+    except Exception:
+        return
+    if not isinstance(data, dict):
+        return
+    if isinstance(data.get("queue"), int):
+        _printer_queue = (data["queue"], time.time())
+    tid, state = data.get("ticket_id"), str(data.get("state", "printed"))
+    with _jobs_lock:
+        job = _jobs.get(tid)
+        if not job:
+            # Quittung kann vor _track() eintreffen (publish laeuft im Netzwerk-Thread)
+            if isinstance(tid, str):
+                _early_acks[tid] = (state, time.time())
+                while len(_early_acks) > JOB_HISTORY:
+                    _early_acks.popitem(last=False)
+            return
+        _set_state(job, state, time.time())
+        ev = dict(job)
+    _notify(ev)
+
+def _set_state(job: dict, state: str, at: float):
+    job["state"] = state
+    if state in TERMINAL_STATES:
+        job["done"] = at
+        job["latency_ms"] = max(0, int((at - job["sent"]) * 1000))
+
+def _on_publish(client, userdata, mid, *args):
+    with _pool_lock:
+        _inflight[id(client)] = max(0, _inflight.get(id(client), 0) - 1)
+
+def _new_client(status: bool) -> mqtt.Client:
+    c = mqtt.Client()
     if MQTT_TLS:
-        _client.tls_set(cert_reqs=ssl.CERT_REQUIRED)
+        c.tls_set(cert_reqs=ssl.CERT_REQUIRED)
     if MQTT_USER or MQTT_PASS:
-        _client.username_pw_set(MQTT_USER, MQTT_PASS)
-    _client.connect(MQTT_HOST, MQTT_PORT, 60)
-    _client.loop_start()
+        c.username_pw_set(MQTT_USER, MQTT_PASS)
+    c.max_inflight_messages_set(MQTT_MAX_INFLIGHT)
+    c.on_publish = _on_publish
+    if status:
+        c.on_connect = _on_connect
+        c.on_message = _on_message
+    c.connect(MQTT_HOST, MQTT_PORT, 60)
+    c.loop_start()
+    return c
+
+def mqtt_start():
+    for i in range(max(1, MQTT_POOL_SIZE)):
+        c = _new_client(status=(i == 0))
+        with _pool_lock:
+            _clients.append(c); _inflight[id(c)] = 0
 
 def mqtt_stop():
-    global _client
+    with _pool_lock:
+        clients = list(_clients)
+        _clients.clear(); _inflight.clear()
+    for c in clients:
+        try:
+            c.loop_stop()
+            c.disconnect()
+        except Exception:
+            pass
+
+def _pick_client(stream: str | None = None) -> mqtt.Client:
+    # MQTT ordnet nur innerhalb einer Verbindung: Jobs mit gleichem stream (Absender,
+    # Ingest-Verbindung) bleiben auf einer festen Verbindung; alle anderen gehen an die
+    # Verbindung mit den wenigsten offenen Publishes und koennen sich ueberholen
+    with _pool_lock:
+        if not _clients:
+            raise RuntimeError("MQTT client not started")
+        if stream is not None:
+            c = _clients[zlib.crc32(stream.encode()) % len(_clients)]
+        else:
+            c = min(_clients, key=lambda x: _inflight[id(x)])
+        _inflight[id(c)] += 1
+        return c
+
+# --------- Job-Status ---------
+def _notify(ev: dict):
+    for loop, q in list(_listeners):
+        loop.call_soon_threadsafe(lambda q=q: q.full() or q.put_nowait(ev))
+
+def _track(ticket_id: str, sent: float):
+    with _jobs_lock:
+        _jobs[ticket_id] = ev = {"ticket_id": ticket_id, "state": "sent", "sent": sent,
+                                 "done": None, "latency_ms": None}
+        early = _early_acks.pop(ticket_id, None)
+        if early:
+            _set_state(ev, *early)
+        while len(_jobs) > JOB_HISTORY:
+            _jobs.popitem(last=False)
+        ev = dict(ev)
+    _notify(ev)
+
+def job_status(ticket_id: str) -> dict | None:
+    with _jobs_lock:
+        job = _jobs.get(ticket_id)
+        return dict(job) if job else None
+
+def recent_jobs(n: int = 50) -> list[dict]:
+    with _jobs_lock:
+        return [dict(j) for j in list(_jobs.values())[-n:]]
+
+def backlog() -> int:
+    """Rueckstau am Drucker: gemeldete Warteschlange oder gesendete, noch nicht bestaetigte Jobs."""
+    if not STATUS_TOPIC:
+        return 0
+    cutoff = time.time() - ACK_TIMEOUT_S
+    with _jobs_lock:
+        open_jobs = sum(1 for j in _jobs.values() if j["state"] not in TERMINAL_STATES and j["sent"] >= cutoff)
+    # Meldung des Druckers nur solange sie frisch ist; schweigt er, zaehlen nur offene Jobs
+    reported = _printer_queue[0] if _printer_queue and _printer_queue[1] >= cutoff else 0
+    return max(open_jobs, reported)
+
+def subscribe_jobs(maxsize: int = 100) -> asyncio.Queue:
+    """Queue mit Status-Events fuer SSE; muss im Event-Loop aufgerufen werden."""
+    q: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+    _listeners.append((asyncio.get_running_loop(), q))
+    return q
+
+def unsubscribe_jobs(q: asyncio.Queue):
+    _listeners[:] = [(lp, x) for lp, x in _listeners if x is not q]
+
+# --------- Publish ---------
+def _publish(payload: dict, qos: int | None = None, stream: str | None = None) -> tuple[str, mqtt.MQTTMessageInfo]:
+    client = _pick_client(stream)
+    ticket_id = f"web-{int(time.time()*1000)}-{uuid.uuid4().hex[:6]}"
+    qos = PUBLISH_QOS if qos is None else qos
+    sent = time.time()
     try:
-        if _client:
-            _client.loop_stop()
-            _client.disconnect()
-    finally:
-        _client = None
-
-def mqtt_publish_image_base64(b64_png: str, cut_paper: int = 1,
-                              paper_width_mm: int = 0, paper_height_mm: int = 0):
-    payload = {
-        "ticket_id": f"web-{int(time.time()*1000)}-{uuid.uuid4().hex[:6]}",
-        "data_type": "png", "data_base64": b64_png,
-        "paper_type": 0, "paper_width_mm": paper_width_mm, "paper_height_mm": paper_height_mm,
+        info = client.publish(TOPIC, json.dumps({"ticket_id": ticket_id, **payload}), qos=qos, retain=False)
+    except Exception:
+        _on_publish(client, None, 0)
+        raise
+    if info.rc != mqtt.MQTT_ERR_SUCCESS and qos == 0:  # verworfen, on_publish kommt nie
+        _on_publish(client, None, info.mid)
+    else:
+        # erst nach erfolgreichem publish zaehlen (QoS>0 ohne Verbindung wird von paho nachgeliefert)
+        _track(ticket_id, sent)
+    return ticket_id, info
+
+def mqtt_publish_data(data: dict, cut_paper: int = 1, qos: int | None = None,
+                      stream: str | None = None) -> str:
+    # data = fertige Nutzdaten aus jobs.encode_image/encode_receipt ("png", "segments" oder "escpos")
+    return mqtt_publish_data_info(data, cut_paper=cut_paper, qos=qos, stream=stream)[0]
+
+def mqtt_publish_data_info(data: dict, cut_paper: int = 1, qos: int | None = None,
+                           stream: str | None = None) -> tuple[str, mqtt.MQTTMessageInfo]:
+    # wie mqtt_publish_data, zusaetzlich paho's MessageInfo: wait_for_publish() wartet, bis
+    # die Nachricht (auch aus paho's interner Warteschlange) beim Broker bestaetigt ist
+    return _publish({
+        **data, "paper_type": 0, "paper_width_mm": 0, "paper_height_mm": 0,
         "cut_paper": cut_paper
-    }
-    if not _client:
-        raise RuntimeError("MQTT client not started")
-    _client.publish(TOPIC, json.dumps(payload), qos=PUBLISH_QOS, retain=False)
+    }, qos=qos, stream=stream)
@@ -0,0 +1,91 @@
+import os, sys, time, random, asyncio, threading, itertools, functools
+from collections import Counter, deque
+from fastapi import Request
+from .config import APP_API_KEY, PROFILE_SAMPLE_RATE, PROFILE_INTERVAL_MS, PROFILE_KEEP
+
+# Stichproben-Profiler fuer einzelne Druckauftraege. Ein Hilfsthread liest in festen
+# Abstaenden den Stack des Event-Loop-Threads und zaehlt "collapsed stacks"
+# (Format von flamegraph.pl / speedscope). Gezaehlt wird nur, solange der Task dieses
+# Requests laeuft; wartet er (await), laufen dort andere Requests -> "other_samples".
+# Ohne Profiling nur eine Header-Abfrage.
+
+_profiles: deque = deque(maxlen=PROFILE_KEEP)
+_ids = itertools.count(1)
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, thread_id: int, interval_s: float):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval_s
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        self.stacks: Counter = Counter()
+        self.other = 0  # Stichproben, in denen ein anderer Task lief oder der Loop wartete
+        self._halt = threading.Event()
+
+    def _ours(self) -> bool:
+        return asyncio.current_task(self.loop) is self.task
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            if not self._ours():
+                self.other += 1; continue
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if not self._ours():  # Taskwechsel waehrend des Lesens
+                self.other += 1; continue
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._halt.set()
+        self.join()
+
+
+def _wanted(request: Request) -> bool:
+    if request.headers.get("x-profile"):
+        key = request.headers.get("x-api-key") or request.query_params.get("key")
+        return key == APP_API_KEY
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def profiled(name: str):
+    """Decorator fuer async Endpunkte mit `request`-Parameter."""
+    def deco(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            request = kwargs.get("request")
+            if request is None or not _wanted(request):
+                return await fn(*args, **kwargs)
+            sampler = _Sampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+            t0 = time.perf_counter(); ok = False
+            sampler.start()
+            try:
+                res = await fn(*args, **kwargs); ok = True
+                return res
+            finally:
+                sampler.stop()
+                _profiles.append({
+                    "id": next(_ids), "name": name, "ts": int(time.time()), "ok": ok,
+                    "ms": round((time.perf_counter() - t0) * 1000, 2),
+                    "samples": sum(sampler.stacks.values()), "other_samples": sampler.other,
+                    "stacks": dict(sampler.stacks),
+                })
+        return wrapper
+    return deco
+
+
+def list_profiles() -> list[dict]:
+    return [{k: v for k, v in p.items() if k != "stacks"} for p in list(_profiles)]
+
+
+def collapsed(profile_id: int) -> str | None:
+    for p in list(_profiles):
+        if p["id"] == profile_id:
+            return "".join(f"{stack} {n}\n" for stack, n in sorted(p["stacks"].items()))
+    return None
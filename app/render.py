@@ -1,14 +1,47 @@
-import io, base64
+import io, re, base64
 from typing import List
 from PIL import Image, ImageDraw, ImageFont
-from .config import ReceiptCfg, TZ
+from .config import ReceiptCfg, TZ, GLYPH_ATLAS
+from .glyphs import glyph_atlas, supported as atlas_supported
 from datetime import datetime
 
-def pil_to_base64_png(img: Image.Image) -> str:
+def pil_to_png_bytes(img: Image.Image, dither: bool = True) -> bytes:
     buf = io.BytesIO()
-    img = img.convert("1")
+    img = img.convert("1", dither=(Image.Dither.FLOYDSTEINBERG if dither else Image.Dither.NONE))
     img.save(buf, format="PNG", optimize=True)
-    return base64.b64encode(buf.getvalue()).decode("ascii")
+    return buf.getvalue()
+
+def pil_to_base64_png(img: Image.Image, dither: bool = True) -> str:
+    return base64.b64encode(pil_to_png_bytes(img, dither)).decode("ascii")
+
+_BLANK_RUN = re.compile(b"\x00+")
+_INK = [255] + [0] * 255  # schwarz -> 1 (Tinte), weiss -> 0
+
+def split_blank_rows(bw: Image.Image, min_run: int) -> List[Image.Image | int]:
+    """1-Bit-Bild an weissen Zeilenlaeufen >= min_run aufteilen (am Anfang/Ende jede Laenge).
+    Liefert Bildstuecke und dazwischen Vorschub in Punkten; gleiches Papierbild.
+    Welche Zeilen Tinte haben, ermitteln point() und getprojection() in C (ein Byte pro
+    Zeile); in Python laeuft danach nur noch die Regex ueber diese Zeilenliste."""
+    w, h = bw.size
+    if h == 0:
+        return []
+    rows = bytes(bw.point(_INK).getprojection()[1])  # 1 = Zeile mit Tinte
+    top, bottom = rows.find(1), rows.rfind(1) + 1
+    if top < 0:  # ganz weiss
+        return [h]
+    out: List[Image.Image | int] = []
+    if top:
+        out.append(top)
+    start = top
+    for m in _BLANK_RUN.finditer(rows, top, bottom):
+        if m.end() - m.start() >= min_run:
+            out.append(bw.crop((0, start, w, m.start())))
+            out.append(m.end() - m.start())
+            start = m.end()
+    out.append(bw if (start, bottom) == (0, h) else bw.crop((0, start, w, bottom)))
+    if bottom < h:
+        out.append(h - bottom)
+    return out
 
 def _textlength(draw, text: str, font: ImageFont.FreeTypeFont) -> int:
     try: return int(draw.textlength(text, font=font))
@@ -31,6 +64,11 @@ def _x_for_align(draw, text: str, font, width: int, align: str, ml: int, mr: int
     if align == "right":  return width - mr - tl
     return ml
 
+def _draw_text(draw, img: Image.Image, xy, text: str, font, atlas: bool):
+    # Atlas nur bei Layout.BASIC pixelgleich, sonst (RAQM) immer FreeType
+    if atlas and atlas_supported(font): glyph_atlas(font).draw(img, xy, text, fill=0)
+    else: draw.text(xy, text, fill=0, font=font)
+
 def _time_str(cfg: ReceiptCfg) -> str:
     fmt = "%Y-%m-%d %H"
     if cfg.time_show_minutes or cfg.time_show_seconds: fmt += ":%M"
@@ -44,19 +82,25 @@ def render_receipt(
     add_time: bool,
     width_px: int,
     cfg: ReceiptCfg,
-    sender_name: str | None = None
+    sender_name: str | None = None,
+    pad_top: bool = True,
+    pad_bottom: bool = True,
+    atlas: bool | None = None
 ) -> Image.Image:
+    # pad_top/pad_bottom=False liefert Teilstuecke ohne Rand, die sich
+    # uebereinander gestapelt pixelgleich zur ganzen Quittung zusammensetzen
     bg = 255
     img = Image.new("L", (width_px, 10), color=bg)
     draw = ImageDraw.Draw(img)
-    cur_y = cfg.margin_top
+    cur_y = cfg.margin_top if pad_top else 0
+    atlas = GLYPH_ATLAS if atlas is None else atlas
     max_w = width_px - cfg.margin_left - cfg.margin_right
 
     # Titel
     title_lines = _wrap(draw, title.strip(), cfg.font_title, max_w) if title else []
     for ln in title_lines:
         x = _x_for_align(draw, ln, cfg.font_title, width_px, cfg.align_title, cfg.margin_left, cfg.margin_right)
-        draw.text((x, cur_y), ln, fill=0, font=cfg.font_title)
+        _draw_text(draw, img, (x, cur_y), ln, cfg.font_title, atlas)
         ascent, descent = cfg.font_title.getmetrics()
         cur_y += int((ascent + descent) * cfg.line_height_mult)
 
@@ -72,7 +116,7 @@ def render_receipt(
     if sender_name:
         tag = f"Von: {sender_name}"
         x = _x_for_align(draw, tag, cfg.font_time, width_px, cfg.align_time, cfg.margin_left, cfg.margin_right)
-        draw.text((x, cur_y), tag, fill=0, font=cfg.font_time)
+        _draw_text(draw, img, (x, cur_y), tag, cfg.font_time, atlas)
         ascent, descent = cfg.font_time.getmetrics()
         cur_y += int((ascent + descent) * cfg.line_height_mult)
 
@@ -80,7 +124,7 @@ def render_receipt(
     if add_time:
         t = _time_str(cfg)
         x = _x_for_align(draw, t, cfg.font_time, width_px, cfg.align_time, cfg.margin_left, cfg.margin_right)
-        draw.text((x, cur_y), t, fill=0, font=cfg.font_time)
+        _draw_text(draw, img, (x, cur_y), t, cfg.font_time, atlas)
         ascent, descent = cfg.font_time.getmetrics()
         cur_y += int((ascent + descent) * cfg.line_height_mult)
 
@@ -92,15 +136,23 @@ def render_receipt(
             continue
         for ln in _wrap(draw, raw.strip(), cfg.font_text, max_w):
             x = _x_for_align(draw, ln, cfg.font_text, width_px, cfg.align_text, cfg.margin_left, cfg.margin_right)
-            draw.text((x, cur_y), ln, fill=0, font=cfg.font_text)
+            _draw_text(draw, img, (x, cur_y), ln, cfg.font_text, atlas)
             ascent, descent = cfg.font_text.getmetrics()
             cur_y += int((ascent + descent) * cfg.line_height_mult)
 
-    cur_y += cfg.margin_bottom
+    if pad_bottom:
+        cur_y += cfg.margin_bottom
     out = Image.new("L", (width_px, cur_y), color=bg)
     out.paste(img, (0, 0))
     return out
 
+def stack_images(parts: List[Image.Image], width_px: int) -> Image.Image:
+    out = Image.new("L", (width_px, sum(p.height for p in parts)), color=255)
+    y = 0
+    for p in parts:
+        out.paste(p, (0, y)); y += p.height
+    return out
+
 def render_image_with_headers(
     image: Image.Image,
     width_px: int,
@@ -0,0 +1,149 @@
+from __future__ import annotations
+import os, json, string
+from typing import Dict, Any, List, Tuple
+from PIL import Image
+
+from .config import ReceiptCfg, settings_mtime
+from .render import render_receipt, stack_images
+
+
+def slots(line: str) -> List[str]:
+    return [f for _lit, f, _spec, _conv in string.Formatter().parse(line) if f is not None]
+
+
+def _expand_line(line: str, variables: Dict[str, str]) -> List[str]:
+    # mehrzeilige Werte -> mehrere Zeilen; leerer Wert bleibt eine Leerzeile wie bei render_receipt
+    return line.format_map(variables).splitlines() or [""]
+
+
+def _static_line(line: str) -> str:
+    # Zeile ohne Platzhalter: {{ und }} wie in variablen Zeilen zu { und }
+    return line.format_map({})
+
+
+class TemplateDB:
+    """
+    Server-seitige Druckvorlagen mit vorgerenderten statischen Teilen.
+    Datei-Format (JSON):
+    {
+      "templates": {
+        "kueche": {
+          "title": "BESTELLUNG",
+          "lines": ["Tisch {tisch}", "", "{positionen}", "", "Guten Appetit!"],
+          "add_datetime": true,
+          "cut": true
+        },
+        ...
+      }
+    }
+    Titel und Zeilen ohne {platzhalter} werden einmal als Kacheln gerendert,
+    pro Auftrag werden nur noch die variablen Zeilen gezeichnet.
+    """
+
+    def __init__(self, path: str = "templates.json"):
+        self.path = path
+        self.data: Dict[str, Any] = {"templates": {}}
+        self._tiles: Dict[str, Tuple[Any, List[Any]]] = {}
+        self._load()
+
+    # --------- persistence ---------
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+            if "templates" not in self.data:
+                self.data["templates"] = {}
+        except Exception:
+            self.data = {"templates": {}}
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    # --------- public API ---------
+    def put(self, name: str, title: str, lines: List[str], add_datetime: bool = False, cut: bool = True):
+        for ln in lines:
+            fields = slots(ln)
+            for f in fields:
+                if not f.isidentifier():
+                    raise ValueError(f"invalid slot name: {f!r}")
+            try:  # Formatangaben wie {x:d} scheitern sonst erst beim Druck
+                ln.format_map({f: "" for f in fields})
+            except (ValueError, TypeError) as e:
+                raise ValueError(f"invalid line {ln!r}: {e}")
+        self.data["templates"][name] = {
+            "title": title, "lines": list(lines),
+            "add_datetime": bool(add_datetime), "cut": bool(cut)
+        }
+        self._tiles.pop(name, None)
+        self._save()
+
+    def delete(self, name: str) -> bool:
+        if self.data["templates"].pop(name, None) is None:
+            return False
+        self._tiles.pop(name, None)
+        self._save()
+        return True
+
+    def get(self, name: str) -> Dict[str, Any] | None:
+        return self.data["templates"].get(name)
+
+    def list(self) -> Dict[str, Any]:
+        return {n: {**t, "slots": sorted({f for ln in t["lines"] for f in slots(ln)})}
+                for n, t in self.data["templates"].items()}
+
+    def expand(self, name: str, variables: Dict[str, str]) -> List[str]:
+        """Alle Zeilen mit eingesetzten Variablen (KeyError bei fehlendem Slot)."""
+        out: List[str] = []
+        for ln in self.get(name)["lines"]:
+            out.extend(_expand_line(ln, variables) if slots(ln) else [_static_line(ln)])
+        return out
+
+    def render(self, name: str, variables: Dict[str, str], width_px: int) -> Image.Image:
+        tpl = self.get(name)
+        cfg = ReceiptCfg()
+        parts: List[Image.Image] = []
+        for tile in self._tiles_for(name, tpl, cfg, width_px):
+            if isinstance(tile, Image.Image):
+                parts.append(tile)
+            elif tile == "time":
+                parts.append(render_receipt("", [], add_time=True, width_px=width_px, cfg=cfg,
+                                            pad_top=False, pad_bottom=False))
+            else:
+                lines = [v for ln in tile for v in _expand_line(ln, variables)]
+                parts.append(render_receipt("", lines, add_time=False, width_px=width_px, cfg=cfg,
+                                            pad_top=False, pad_bottom=False))
+        return stack_images(parts, width_px)
+
+    # --------- tiles ---------
+    def _tiles_for(self, name: str, tpl: Dict[str, Any], cfg: ReceiptCfg, width_px: int) -> List[Any]:
+        # Cache verfaellt, wenn die Layout-Einstellungen geaendert wurden
+        key = (width_px, settings_mtime())
+        hit = self._tiles.get(name)
+        if hit and hit[0] == key:
+            return hit[1]
+
+        def static(lines: List[str], title: str = "", top: bool = False, bottom: bool = False):
+            return render_receipt(title, [_static_line(ln) for ln in lines], add_time=False,
+                                  width_px=width_px, cfg=cfg, pad_top=top, pad_bottom=bottom)
+
+        # Kacheln: Bild = statisch, "time" = Zeitstempel, Liste = variable Zeilen
+        tiles: List[Any] = [static([], title=tpl.get("title", ""), top=True)]
+        if tpl.get("add_datetime"):
+            tiles.append("time")
+        group: List[str] = []
+        for ln in tpl["lines"]:
+            is_var = bool(slots(ln))
+            if group and bool(slots(group[0])) != is_var:
+                tiles.append(group if slots(group[0]) else static(group))
+                group = []
+            group.append(ln)
+        if group:
+            tiles.append(group if slots(group[0]) else static(group))
+        tiles.append(static([], bottom=True))
+        self._tiles[name] = (key, tiles)
+        return tiles
@@ -4,8 +4,8 @@ from fastapi.responses import HTMLResponse, RedirectResponse
 
 from .config import PRINT_WIDTH_PX, UI_PASS, ReceiptCfg, now_str
 from .security import require_ui_auth, issue_cookie
-from .render import render_receipt, render_image_with_headers, pil_to_base64_png
-from .mqtt_client import mqtt_publish_image_base64
+from .render import render_receipt, render_image_with_headers
+from .jobs import publish_image
 
 router = APIRouter()
 
@@ -98,6 +98,8 @@ HTML_UI = r"""
   <div class="tab" role="tab" id="tab-img" aria-controls="pane_img" aria-selected="false" tabindex="-1">Bild</div>
 </div>
 
+<div id="job-status" class="card hidden" aria-live="polite"></div>
+
 <section id="pane_tpl" class="card" role="tabpanel" aria-labelledby="tab-tpl">
   <form method="post" action="/ui/print/template">
     <div class="grid">
@@ -206,6 +208,19 @@ const AUTH_REQUIRED=String("{{AUTH_REQUIRED}}").toLowerCase().trim()==="true";
   const el=document.getElementById(id);
   if(el) el.classList.toggle("hidden", !AUTH_REQUIRED);
 });
+
+// Live-Status der Auftraege (SSE), nur im angemeldeten Admin-UI
+if(!AUTH_REQUIRED && location.pathname.startsWith("/ui")){
+  const st=document.getElementById("job-status");
+  const es=new EventSource("/api/jobs/events");
+  es.onmessage=e=>{
+    const j=JSON.parse(e.data);
+    st.classList.remove("hidden");
+    st.textContent="Letzter Auftrag: "+j.state
+      +(j.latency_ms!=null?" nach "+(j.latency_ms/1000).toFixed(1)+" s":"")
+      +" · Warteschlange: "+j.backlog;
+  };
+}
 </script>
 """.replace("{w}", str(PRINT_WIDTH_PX))
 
@@ -250,8 +265,7 @@ async def ui_print_template(
     cfg = ReceiptCfg()
     img = render_receipt(title.strip(), [ln.rstrip() for ln in lines.splitlines()],
                          add_time=add_dt, width_px=PRINT_WIDTH_PX, cfg=cfg)
-    b64 = pil_to_base64_png(img)
-    mqtt_publish_image_base64(b64, cut_paper=1)
+    publish_image(img)
     resp = RedirectResponse("/ui#tpl", status_code=303)
     if set_cookie:
         issue_cookie(resp)
@@ -272,8 +286,7 @@ async def ui_print_raw(
     cfg = ReceiptCfg()
     lines = (text + (f"\n{now_str('%Y-%m-%d %H:%M')}" if add_dt else "")).splitlines()
     img = render_receipt("", lines, add_time=False, width_px=PRINT_WIDTH_PX, cfg=cfg)
-    b64 = pil_to_base64_png(img)
-    mqtt_publish_image_base64(b64, cut_paper=1)
+    publish_image(img)
     resp = RedirectResponse("/ui#raw", status_code=303)
     if set_cookie:
         issue_cookie(resp)
@@ -299,8 +312,7 @@ async def ui_print_image(
     cfg = ReceiptCfg()
     composed = render_image_with_headers(src, PRINT_WIDTH_PX, cfg,
                                          title=(img_title or ""), subtitle=(img_subtitle or ""))
-    b64 = pil_to_base64_png(composed)
-    mqtt_publish_image_base64(b64, cut_paper=1)
+    publish_image(composed)
     resp = RedirectResponse("/ui#img", status_code=303)
     if set_cookie:
         issue_cookie(resp)
@@ -0,0 +1,76 @@
+# bench_glyphs.py
+"""
+Vergleicht das Zeichnen von Quittungszeilen mit ImageDraw (draw.text, FreeType pro Zeile)
+und mit dem Glyph-Atlas: Laufzeit pro Zeile und Pixelgleichheit jeder einzelnen Zeile.
+Gemessen wird genau der Schritt, den render_receipt(atlas=True) austauscht (_draw_text).
+
+  python bench_glyphs.py                         # Schriften aus ReceiptCfg (title/text/time)
+  python bench_glyphs.py --font Lato.ttf --size 24 32 -n 5000
+Exit-Code 1, wenn eine Zeile nicht pixelgleich ist.
+"""
+import sys, time, random, argparse
+from PIL import Image, ImageDraw, ImageFont, ImageChops
+from app.glyphs import GlyphAtlas, supported
+
+WORDS = ("Milch Brot Eier Käse Äpfel Tomaten Wasser Kaffee Termin Zahnarzt um 14:30 "
+         "Paket abholen Post Rechnung bezahlen CHF 12.50 Danke! Tisch 7 2x Pizza Margherita "
+         "AVATAR Waffel fy Tj 'Zitat' (Klammer) 3/4 100% 2025-08-25").split()
+
+
+def _lines(n: int, seed: int = 1):
+    rnd = random.Random(seed)
+    return [" ".join(rnd.choices(WORDS, k=rnd.randint(1, 8))) for _ in range(n)]
+
+
+def _fonts(args):
+    if args.font:
+        return [(f"{p}@{s}", ImageFont.truetype(p, s)) for p in args.font for s in args.size]
+    from app.config import ReceiptCfg
+    cfg = ReceiptCfg()
+    return [("font_title", cfg.font_title), ("font_text", cfg.font_text), ("font_time", cfg.font_time)]
+
+
+def _bench(font, lines, width: int):
+    atlas = GlyphAtlas(font)
+    for ln in lines[:50]:  # Atlas vorwaermen (Erstrasterung nicht mitmessen)
+        atlas.draw(Image.new("L", (width, 10), 255), (0, 0), ln)
+    ascent, descent = font.getmetrics()
+    size = (width, ascent + descent + 8)
+    t_draw = t_atlas = 0.0
+    diff = 0
+    for ln in lines:
+        a = Image.new("L", size, 255); b = a.copy()
+        draw = ImageDraw.Draw(a)
+        t0 = time.perf_counter(); draw.text((8, 4), ln, fill=0, font=font)
+        t1 = time.perf_counter(); atlas.draw(b, (8, 4), ln, fill=0)
+        t2 = time.perf_counter()
+        t_draw += t1 - t0; t_atlas += t2 - t1
+        if ImageChops.difference(a, b).getbbox():
+            diff += 1
+    return t_draw, t_atlas, diff
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=2000, help="Zeilen pro Schrift")
+    ap.add_argument("--font", nargs="*", help="TTF-Dateien statt der Schriften aus ReceiptCfg")
+    ap.add_argument("--size", nargs="*", type=int, default=[24, 32])
+    ap.add_argument("--width", type=int, default=576)
+    args = ap.parse_args(argv)
+    lines = _lines(args.n)
+
+    failed = 0
+    for name, font in _fonts(args):
+        if not supported(font):
+            print(f"{name}: Layout nicht BASIC -> render_receipt nutzt draw.text, uebersprungen")
+            continue
+        t_draw, t_atlas, diff = _bench(font, lines, args.width)
+        failed += diff
+        print(f"{name}: draw.text {t_draw * 1e6 / args.n:8.1f} us/Zeile, "
+              f"Atlas {t_atlas * 1e6 / args.n:8.1f} us/Zeile ({t_draw / max(t_atlas, 1e-9):.1f}x), "
+              f"pixelgleich {args.n - diff}/{args.n}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
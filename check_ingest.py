@@ -0,0 +1,100 @@
+# check_ingest.py
+"""
+Regressionspruefung fuer /api/ingest ohne Broker: die App wird direkt ueber ASGI
+angesprochen, mqtt_publish_data durch eine Aufzeichnung ersetzt.
+
+  python check_ingest.py
+Prueft:
+  - ein einzelner Job wird gesendet und quittiert, ohne dass weitere Jobs folgen
+  - mehrere Jobs: Quittungen und Sendungen in Eingangsreihenfolge
+  - Trennung direkt nach dem Senden: gelesene Jobs werden trotzdem gedruckt
+Exit-Code 1, wenn eine Pruefung fehlschlaegt.
+"""
+import sys, json, asyncio
+from app import create_app
+from app import api
+from app.config import APP_API_KEY
+
+TIMEOUT_S = 10.0
+published: list = []
+
+
+def _fake_publish(data, cut_paper=1, qos=None, stream=None):
+    published.append(stream)
+    return f"check-{len(published)}"
+
+
+class _Conn:
+    """Eine WebSocket-Verbindung auf ASGI-Ebene."""
+
+    def __init__(self, app):
+        self.to_app: asyncio.Queue = asyncio.Queue()
+        self.from_app: asyncio.Queue = asyncio.Queue()
+        scope = {"type": "websocket", "path": "/api/ingest", "raw_path": b"/api/ingest",
+                 "query_string": b"", "headers": [(b"x-api-key", APP_API_KEY.encode())],
+                 "subprotocols": [], "scheme": "ws", "server": ("test", 80), "client": ("test", 1)}
+        self.task = asyncio.create_task(app(scope, self.to_app.get, self.from_app.put))
+
+    async def open(self):
+        await self.to_app.put({"type": "websocket.connect"})
+        msg = await asyncio.wait_for(self.from_app.get(), TIMEOUT_S)
+        assert msg["type"] == "websocket.accept", msg
+
+    async def send(self, *jobs):
+        await self.to_app.put({"type": "websocket.receive", "text": "\n".join(json.dumps(j) for j in jobs)})
+
+    async def ack(self) -> dict:
+        msg = await asyncio.wait_for(self.from_app.get(), TIMEOUT_S)
+        return json.loads(msg["text"])
+
+    async def close(self):
+        await self.to_app.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, TIMEOUT_S)
+
+
+def _job(n: int) -> dict:
+    return {"id": n, "text": f"Notiz {n}", "add_datetime": False}
+
+
+async def _single(app):
+    conn = _Conn(app); await conn.open()
+    await conn.send(_job(1))
+    ack = await conn.ack()  # darf nicht auf weitere Jobs warten
+    await conn.close()
+    assert ack["seq"] == 1 and ack["ok"], ack
+
+
+async def _ordered(app):
+    conn = _Conn(app); await conn.open()
+    await conn.send(*[_job(n) for n in range(1, 11)])
+    await conn.send("kein Objekt", _job(11))
+    acks = [await conn.ack() for _ in range(12)]
+    await conn.close()
+    assert [a["seq"] for a in acks] == list(range(1, 11)) + [11, 11], acks
+    assert [a["ok"] for a in acks].count(False) == 1, acks
+
+
+async def _disconnect(app):
+    before = len(published)
+    conn = _Conn(app); await conn.open()
+    await conn.send(*[_job(n) for n in range(1, 4)])
+    await conn.close()
+    assert len(published) - before == 3, published[before:]
+
+
+async def main() -> int:
+    api.mqtt_publish_data = _fake_publish
+    app = create_app()
+    failed = 0
+    for check in (_single, _ordered, _disconnect):
+        try:
+            await check(app)
+            print(f"{check.__name__[1:]}: ok")
+        except (AssertionError, asyncio.TimeoutError) as e:
+            failed += 1
+            print(f"{check.__name__[1:]}: FEHLER {type(e).__name__} {e}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,187 @@
+# render_jobs.py
+"""
+Offline-Massenrendering ueber alle Kerne.
+
+Liest Druckauftraege als JSONL (eine Zeile = ein Auftrag, gleiche Form wie die API):
+  {"title": "TASKS", "lines": ["a", "b"], "add_datetime": true}     # wie PrintPayload
+  {"text": "Kurze Notiz", "add_datetime": false}                    # wie RawPayload
+  {"image": "bilder/logo.png", "title": "...", "subtitle": "..."}   # Bild mit Kopfzeilen
+Optional wie in der API: "sender" sowie "cut", "qos", "text_mode" (diese nur bei --publish).
+
+Beispiele:
+  python render_jobs.py jobs.jsonl -o out/ --format png -j 8
+  cat jobs.jsonl | python render_jobs.py - --format pbm -o out/
+  python render_jobs.py jobs.jsonl --publish   # wie die API: encode_image/encode_receipt + MQTT
+Mit --publish wird in Eingabereihenfolge gesendet und ein Auftrag erst gezaehlt, wenn
+der Broker ihn bestaetigt hat.
+"""
+from __future__ import annotations
+import os, sys, io, json, time, argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+PUBLISH_TIMEOUT_S = 60  # Wartezeit auf die Bestaetigung des Brokers pro Auftrag
+STREAM = "render_jobs"  # eine feste MQTT-Verbindung -> Reihenfolge bleibt
+
+_cfg = None  # ReceiptCfg pro Worker-Prozess nur einmal laden
+
+
+def _receipt_args(job: dict) -> tuple[str, list[str], bool]:
+    from app.config import now_str
+    if "text" in job:
+        lines = (job["text"] + (f"\n{now_str('%Y-%m-%d %H:%M')}" if job.get("add_datetime") else "")).splitlines()
+        return "", lines, False
+    return job.get("title", "TASKS"), job.get("lines", []), job.get("add_datetime", True)
+
+
+def _image(job: dict):
+    from PIL import Image
+    from app.config import PRINT_WIDTH_PX
+    from app.render import render_receipt, render_image_with_headers
+    if "image" in job:
+        return render_image_with_headers(Image.open(job["image"]), PRINT_WIDTH_PX, _cfg,
+                                         title=job.get("title"), subtitle=job.get("subtitle"))
+    title, lines, add_time = _receipt_args(job)
+    return render_receipt(title, lines, add_time=add_time, width_px=PRINT_WIDTH_PX, cfg=_cfg,
+                          sender_name=job.get("sender"))
+
+
+def _encode(job: dict) -> dict:
+    # fertige MQTT-Nutzdaten wie bei den API-Endpunkten
+    from app.jobs import encode_image, encode_receipt
+    qos = job.get("qos")
+    if qos not in (None, 0, 1, 2):
+        raise ValueError("qos must be 0, 1 or 2")
+    cut = bool(job.get("cut", True))
+    if "image" in job:
+        data, cut_paper = encode_image(_image(job)), (1 if cut else 0)
+    else:
+        title, lines, add_time = _receipt_args(job)
+        data, cut_paper = encode_receipt(title, lines, add_time, cut=cut, sender_name=job.get("sender"),
+                                         text_mode=job.get("text_mode"))
+    return {"data": data, "cut_paper": cut_paper, "qos": qos}
+
+
+def _render(idx: int, line: str, fmt: str) -> tuple[int, bytes | None, str | None]:
+    # fmt "payload": _encode() als JSON (fuer --publish)
+    global _cfg
+    from app.config import ReceiptCfg
+    from app.render import pil_to_png_bytes
+    try:
+        if _cfg is None:
+            _cfg = ReceiptCfg()
+        job = json.loads(line)
+        if fmt == "payload":
+            return idx, json.dumps(_encode(job)).encode(), None
+        img = _image(job)
+        if fmt == "pbm":  # gepacktes 1-Bit-Raster (P4)
+            buf = io.BytesIO(); img.convert("1").save(buf, format="PPM")
+            return idx, buf.getvalue(), None
+        return idx, pil_to_png_bytes(img), None
+    except Exception as e:
+        return idx, None, f"{type(e).__name__}: {e}"
+
+
+def _progress(done: int, errors: int, t0: float, final: bool = False):
+    dt = max(1e-9, time.monotonic() - t0)
+    sys.stderr.write(f"\r{done} gerendert, {errors} Fehler, {done / dt:.1f}/s" + ("\n" if final else ""))
+    sys.stderr.flush()
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Druckauftraege (JSONL) offline rendern.")
+    ap.add_argument("input", help="JSONL-Datei oder - fuer stdin")
+    ap.add_argument("-o", "--out", default="out", help="Zielordner fuer Dateien")
+    ap.add_argument("--format", choices=["png", "pbm"], default="png")
+    ap.add_argument("--publish", action="store_true", help="per MQTT senden statt Dateien schreiben")
+    ap.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="Anzahl Prozesse")
+    args = ap.parse_args(argv)
+
+    src = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    if args.publish:
+        from app.config import MQTT_MAX_INFLIGHT
+        from app.mqtt_client import mqtt_start, mqtt_publish_data_info
+        mqtt_start()
+    else:
+        os.makedirs(args.out, exist_ok=True)
+
+    done = errors = 0
+    unconfirmed: deque = deque()  # (idx, MessageInfo) gesendet, vom Broker noch nicht bestaetigt
+
+    def fail(idx: int, err: str):
+        nonlocal errors
+        sys.stderr.write(f"\nZeile {idx + 1}: {err}\n")
+        errors += 1
+
+    def confirm(idx: int, info):
+        # paho sendet QoS>0 ueber MQTT_MAX_INFLIGHT hinaus erst, wenn Bestaetigungen kommen;
+        # erst danach ist der Auftrag wirklich beim Broker
+        nonlocal done
+        try:
+            info.wait_for_publish(PUBLISH_TIMEOUT_S)
+            if not info.is_published():
+                raise TimeoutError(f"keine Bestaetigung nach {PUBLISH_TIMEOUT_S} s")
+        except Exception as e:
+            fail(idx, f"nicht gesendet: {type(e).__name__}: {e}")
+            return
+        done += 1
+
+    def emit(idx: int, data: bytes | None, err: str | None):
+        nonlocal done
+        if err:
+            fail(idx, err); return
+        if args.publish:
+            p = json.loads(data)
+            try:
+                _tid, info = mqtt_publish_data_info(p["data"], cut_paper=p["cut_paper"], qos=p["qos"], stream=STREAM)
+            except Exception as e:
+                fail(idx, f"nicht gesendet: {type(e).__name__}: {e}"); return
+            unconfirmed.append((idx, info))
+            while len(unconfirmed) > max(1, MQTT_MAX_INFLIGHT):  # begrenzt paho's Warteschlange
+                confirm(*unconfirmed.popleft())
+        else:
+            with open(os.path.join(args.out, f"{idx:06d}.{args.format}"), "wb") as f:
+                f.write(data)
+            done += 1
+
+    order: deque = deque()  # eingereichte idx in Eingabereihenfolge
+    held: dict = {}         # fertige Ergebnisse, die auf fruehere Auftraege warten
+
+    def collect(finished):
+        for fut in finished:
+            idx, data, err = fut.result()
+            held[idx] = (data, err)
+        while order and order[0] in held:  # in Eingabereihenfolge ausgeben
+            idx = order.popleft()
+            emit(idx, *held.pop(idx))
+
+    t0 = last = time.monotonic()
+    max_pending = args.jobs * 4  # begrenzt Speicher: nie die ganze Datei im Flug (inkl. wartender Ergebnisse)
+    pending = set()
+    try:
+        with ProcessPoolExecutor(max_workers=args.jobs) as ex:
+            for idx, line in enumerate(src):
+                if not line.strip():
+                    continue
+                pending.add(ex.submit(_render, idx, line, "payload" if args.publish else args.format))
+                order.append(idx)
+                while len(pending) + len(held) >= max_pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                    if time.monotonic() - last >= 1:
+                        _progress(done, errors, t0); last = time.monotonic()
+            collect(wait(pending).done)
+        while unconfirmed:
+            confirm(*unconfirmed.popleft())
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if args.publish:
+            from app.mqtt_client import mqtt_stop
+            mqtt_stop()
+    _progress(done, errors, t0, final=True)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())